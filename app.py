@@ -1,7 +1,9 @@
 
 import streamlit as st
 import pandas as pd
-import io, uuid, os
+import io, uuid, os, threading, time, json, unicodedata
+from itertools import accumulate
+from functools import lru_cache
 from pathlib import Path
 from datetime import date
 from reportlab.lib.pagesizes import A4
@@ -11,6 +13,15 @@ from reportlab.graphics.barcode import qr
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
 
 # ---------------- Fonts for PDF ----------------
 try:
@@ -22,17 +33,52 @@ except Exception:
     FONT_REG = "Helvetica"
     FONT_BLD = "Helvetica-Bold"
 
+# loaders hand out shallow views of one shared snapshot; copy-on-write keeps edits from leaking into it
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(page_title="Παραγγελίες Μαθητών", layout="wide")
 
 # ---------------- Paths & Config ----------------
 DATA_DIR = Path(".")
 PRODUCTS_PATH = DATA_DIR / "products.csv"
-STUDENTS_PATH = DATA_DIR / "students.csv"
-ORDERS_PATH   = DATA_DIR / "orders.csv"
+SCHOOLS_DIR   = DATA_DIR / "schools"
+INGEST_REQUESTS = os.getenv("INGEST_REQUESTS", "0") == "1"
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(4 << 20)))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "0.5"))
+ORDERS_COMPACT_AT = int(os.getenv("ORDERS_COMPACT_AT", "500"))
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "0.5"))
+ORDER_COLS = ["order_id","date","student","school","class","product","qty","unit_price","total"]
 DEFAULT_LOGO  = Path("/mnt/data/logo (2).png")
 APP_URL = st.secrets.get("APP_URL", os.getenv("APP_URL", "https://your-app-url-here"))
 ADMIN_PIN = st.secrets.get("ADMIN_PIN", os.getenv("ADMIN_PIN", "1234"))
 
+class DataStore:
+    # one data directory: the deployment root, or schools/<school>/ in the sharded layout; products.csv always stays at the root
+    def __init__(self, root):
+        self.root = Path(root)
+        self.students = self.root / "students.csv"
+        self.orders   = self.root / "orders.csv"
+        self.patches  = self.root / "orders_patches.csv"
+        self.lock     = self.root / "orders.lock"
+        self.requests = self.root / "requests.jsonl"
+        self.requests_offset  = self.root / "requests.offset"
+        self.requests_rejects = self.root / "requests_rejects.jsonl"
+        self.archive  = self.root / "archive"
+        self.manifest = self.archive / "manifest.json"
+
+def _shard_dir(school):
+    return SCHOOLS_DIR / ((school.strip() or "χωρίς σχολείο").replace("/", "-"))
+
+def _data_roots():
+    # every data directory: the school shards in the sharded layout, otherwise the root
+    shards = sorted(p for p in SCHOOLS_DIR.iterdir() if p.is_dir()) if SCHOOLS_DIR.is_dir() else []
+    return shards or [DATA_DIR]
+
+SHARDS = [p.name for p in _data_roots() if p != DATA_DIR]
+STORE = DataStore(DATA_DIR)  # where this session reads and writes; None while an admin views all schools
+STORES = [STORE]             # what reports fan out over
+
 # ---------------- Role ----------------
 role = st.sidebar.selectbox("Ρόλος", ["Καταχώριση", "Διαχειριστής"], index=0)
 is_admin = False
@@ -44,6 +90,20 @@ if role == "Διαχειριστής":
     else:
         st.sidebar.warning("Πληκτρολόγησε σωστό PIN για λειτουργίες διαχείρισης.")
 
+# ---------------- School (sharded layout) ----------------
+ALL_SCHOOLS = "Όλα τα σχολεία"
+if SHARDS:
+    school_opts = SHARDS + ([ALL_SCHOOLS] if is_admin else [])
+    if st.session_state.get("shard_next") in school_opts:
+        # a school just created from the Μαθητές page opens selected
+        st.session_state["shard"] = st.session_state.pop("shard_next")
+    shard = st.sidebar.selectbox("Σχολείο", school_opts, key="shard")
+    if shard == ALL_SCHOOLS:
+        STORE, STORES = None, [DataStore(SCHOOLS_DIR / s) for s in SHARDS]
+    else:
+        STORE = DataStore(SCHOOLS_DIR / shard)
+        STORES = [STORE]
+
 # ---------------- Logo controls ----------------
 st.sidebar.markdown("### Ρυθμίσεις εμφάνισης")
 if "logo_bytes" not in st.session_state:
@@ -60,21 +120,6 @@ if is_admin:
 else:
     app_url = APP_URL
 
-# ---------------- Diagnostics (sidebar) ----------------
-with st.sidebar.expander("🔍 Διαγνωστικά"):
-    try:
-        for lbl, path in [("products.csv", PRODUCTS_PATH), ("students.csv", STUDENTS_PATH), ("orders.csv", ORDERS_PATH)]:
-            ok = path.exists()
-            size = (path.stat().st_size if ok else 0)
-            st.write(f"- {lbl}: {'✅' if ok else '❌'} ({size} bytes)")
-        _p = pd.read_csv(PRODUCTS_PATH) if PRODUCTS_PATH.exists() else pd.DataFrame()
-        _s = pd.read_csv(STUDENTS_PATH) if STUDENTS_PATH.exists() else pd.DataFrame()
-        _o = pd.read_csv(ORDERS_PATH) if ORDERS_PATH.exists() else pd.DataFrame()
-        st.write(f"Προϊόντα: {len(_p)} • Μαθητές/τριες: {len(_s)} • Γραμμές παραγγελιών: {len(_o)}")
-        st.write("Ρόλος:", role, "| Admin:", is_admin)
-    except Exception as e:
-        st.write("Σφάλμα:", e)
-
 def show_topbar():
     col_logo, col_title = st.columns([1, 6])
     with col_logo:
@@ -85,75 +130,646 @@ def show_topbar():
         st.caption("Μαθητές από πολλά σχολεία, παραγγελίες, PDF δελτία, αναφορές & εξαγωγές.")
 
 # ---------------- Loaders / Savers ----------------
-@st.cache_data
-def load_products():
+def _read_products():
     if PRODUCTS_PATH.exists():
         df = pd.read_csv(PRODUCTS_PATH)
     else:
         df = pd.DataFrame(columns=["product","price"])
     if "product" not in df.columns: df["product"] = ""
     if "price" not in df.columns: df["price"] = 0.0
-    df["product"] = df["product"].astype(str).str.strip()
+    df["product"] = df["product"].fillna("").astype(str).str.strip()
     df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0.0)
     return df
 
-@st.cache_data
-def load_students():
-    if STUDENTS_PATH.exists():
-        df = pd.read_csv(STUDENTS_PATH)
+def _read_students(store):
+    if store.students.exists():
+        df = pd.read_csv(store.students)
     else:
         df = pd.DataFrame(columns=["student","school","class"])
     for c in ["student","school","class"]:
         if c not in df.columns: df[c] = ""
-    df["student"] = df["student"].astype(str).str.strip()
-    df["school"]  = df["school"].astype(str).str.strip()
-    df["class"]   = df["class"].astype(str).str.strip()
+    df["student"] = df["student"].fillna("").astype(str).str.strip()
+    df["school"]  = df["school"].fillna("").astype(str).str.strip()
+    df["class"]   = df["class"].fillna("").astype(str).str.strip()
+    df["key"] = df["student"].map(_fold) + "|" + df["school"].map(_fold) + "|" + df["class"].map(_fold)
     return df
 
-@st.cache_data
-def load_orders():
-    if ORDERS_PATH.exists():
-        df = pd.read_csv(ORDERS_PATH, parse_dates=["date"])
-    else:
-        df = pd.DataFrame(columns=["order_id","date","student","school","class","product","qty","unit_price","total"])
-    for c in ["order_id","date","student","school","class","product","qty","unit_price","total"]:
+@lru_cache(maxsize=1 << 16)
+def _fold(s):
+    # "ΑΛΕΞΊΟΥ  ΚΩΝΣΤΑΝΤΊΝΑ" -> "αλεξιου κωνσταντινα": accents dropped, whitespace collapsed, case folded
+    s = unicodedata.normalize("NFD", str(s))
+    return " ".join("".join(ch for ch in s if not unicodedata.combining(ch)).casefold().split())
+
+def _student_key(student, school="", cls=""):
+    return f"{_fold(student)}|{_fold(school)}|{_fold(cls)}"
+
+def student_key_index(store=None):
+    return _snap(store).derived("students", "keys", lambda df: frozenset(df["key"]))
+
+def _normalize_orders(df):
+    for c in ORDER_COLS:
         if c not in df.columns: df[c] = pd.NA
     df["order_id"] = df["order_id"].astype(str)
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["student"] = df["student"].astype(str).str.strip()
-    df["school"]  = df["school"].astype(str).str.strip()
-    df["class"]   = df["class"].astype(str).str.strip()
-    df["product"] = df["product"].astype(str).str.strip()
+    df["student"] = df["student"].fillna("").astype(str).str.strip()
+    df["school"]  = df["school"].fillna("").astype(str).str.strip()
+    df["class"]   = df["class"].fillna("").astype(str).str.strip()
+    df["product"] = df["product"].fillna("").astype(str).str.strip()
     for c in ["qty","unit_price","total"]:
         df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
     return df
 
+def _read_orders_base(store):
+    if store.orders.exists() and store.orders.stat().st_size > 0:
+        df = pd.read_csv(store.orders, parse_dates=["date"])
+    else:
+        df = pd.DataFrame(columns=ORDER_COLS)
+    return _normalize_orders(df)
+
+def _read_order_patches(store):
+    if store.patches.exists() and store.patches.stat().st_size > 0:
+        df = pd.read_csv(store.patches, dtype={"op": str, "order_id": str})
+    else:
+        df = pd.DataFrame(columns=["op"] + ORDER_COLS)
+    return _normalize_orders(df)
+
+def _apply_order_patches(base, patches):
+    # last entry per order_id wins: "put" upserts the full row, "del" is a tombstone
+    if patches.empty:
+        return base
+    last = patches.drop_duplicates(subset=["order_id"], keep="last").set_index("order_id")
+    puts = last[last["op"] == "put"]
+    hit = base["order_id"].isin(puts.index)
+    if hit.any():
+        src = puts.loc[base.loc[hit, "order_id"]]
+        for c in ORDER_COLS[1:]:
+            base.loc[hit, c] = src[c].to_numpy()
+    new = puts[~puts.index.isin(base["order_id"])]
+    if not new.empty:
+        base = pd.concat([base, new.reset_index()[ORDER_COLS]], ignore_index=True)
+    dead = last.index[last["op"] == "del"]
+    if len(dead):
+        base = base[~base["order_id"].isin(dead)].reset_index(drop=True)
+    return base
+
+def _read_orders(store):
+    return _apply_order_patches(_read_orders_base(store), _read_order_patches(store))
+
+def _store(store=None):
+    if store is None and STORE is None:
+        raise RuntimeError("Επίλεξε σχολείο για αλλαγές στα δεδομένα.")
+    return store or STORE
+
+def _active(store=None):
+    # the shard(s) a read covers: the given one, the session's school, or every school in the "all schools" view
+    return [store] if store is not None else ([STORE] if STORE is not None else STORES)
+
+def _snap(store=None):
+    return _data_snapshot(str(_store(store).root))
+
+def _fan_out(name, store=None):
+    frames = [_data_snapshot(str(s.root)).get(name) for s in _active(store)]
+    return frames[0].copy(deep=False) if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def load_products():
+    return _data_snapshot(str(DATA_DIR)).get("products").copy(deep=False)
+
+def load_students(store=None):
+    return _fan_out("students", store)
+
+def load_orders(store=None):
+    return _fan_out("orders", store)
+
 def save_products(df):
     df = df[["product","price"]].copy()
     df["product"] = df["product"].astype(str).str.strip()
     df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0.0)
     df = df.drop_duplicates(subset=["product"]).sort_values("product")
     df.to_csv(PRODUCTS_PATH, index=False, encoding="utf-8-sig")
-    (load_products.clear() if hasattr(load_products, "clear") else None)
+    _data_snapshot(str(DATA_DIR)).refresh("products")
 
-def save_students(df):
+def save_students(df, store=None):
+    store = _store(store)
     for c in ["student","school","class"]:
         if c not in df.columns: df[c] = ""
     df = df[["student","school","class"]].copy()
-    df["student"] = df["student"].astype(str).str.strip()
-    df["school"]  = df["school"].astype(str).str.strip()
-    df["class"]   = df["class"].astype(str).str.strip()
-    df = df[df["student"].str.len()>0].drop_duplicates(subset=["student","school","class"]).sort_values(["school","class","student"])
-    df.to_csv(STUDENTS_PATH, index=False, encoding="utf-8-sig")
-    (load_students.clear() if hasattr(load_students, "clear") else None)
-
-def save_orders(df):
-    cols = ["order_id","date","student","school","class","product","qty","unit_price","total"]
+    df["student"] = df["student"].fillna("").astype(str).str.strip()
+    df["school"]  = df["school"].fillna("").astype(str).str.strip()
+    df["class"]   = df["class"].fillna("").astype(str).str.strip()
+    keys = pd.Series([_student_key(*r) for r in zip(df["student"], df["school"], df["class"])], index=df.index)
+    df = df[(df["student"].str.len()>0) & ~keys.duplicated()].sort_values(["school","class","student"])
+    df.to_csv(store.students, index=False, encoding="utf-8-sig")
+    _snap(store).refresh("students")
+
+def add_students(df, store=None):
+    # new roster rows are appended; the file is rewritten only when its header is not the 3-column one
+    store = _store(store)
+    if not _append_csv(store.students, df, ["student","school","class"]):
+        save_students(pd.concat([load_students(store), df], ignore_index=True), store)
+    _snap(store).refresh("students")
+
+def _write_csv_atomic(df, path):
+    # readers in other sessions/processes never see a half-written file
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, path)
+
+def save_orders(df, store=None):
+    store = _store(store)
+    cols = ORDER_COLS
     for c in cols:
         if c not in df.columns: df[c] = pd.NA
     df = df[cols].copy()
-    df.to_csv(ORDERS_PATH, index=False, encoding="utf-8-sig")
-    (load_orders.clear() if hasattr(load_orders, "clear") else None)
+    with _orders_lock(store):
+        _write_csv_atomic(df, store.orders)
+        store.patches.unlink(missing_ok=True)
+    _snap(store).refresh("orders")
+
+def append_orders(df, store=None):
+    # new lines are appended under the lock instead of rewriting a possibly stale copy of the whole file
+    store = _store(store)
+    df = df[ORDER_COLS].copy()
+    with _orders_lock(store):
+        if not _append_csv(store.orders, df, ORDER_COLS):
+            save_orders(pd.concat([_read_orders(store), df], ignore_index=True), store)
+    _snap(store).refresh("orders")
+
+# ---------------- Order patch log ----------------
+class _OrdersLock:
+    # serialises order writers within the process (RLock) and across server processes (flock on orders.lock)
+    def __init__(self, path):
+        self.path = path
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.fh = None
+
+    def __enter__(self):
+        self.rlock.acquire()
+        self.depth += 1
+        if self.depth == 1 and fcntl is not None:
+            self.fh = open(self.path, "a")
+            fcntl.flock(self.fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and self.fh is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+            self.fh.close()
+            self.fh = None
+        self.rlock.release()
+
+@st.cache_resource
+def _orders_lock_for(root):
+    return _OrdersLock(DataStore(root).lock)
+
+def _orders_lock(store=None):
+    return _orders_lock_for(str(_store(store).root))
+
+def _append_order_patches(patches, store):
+    with _orders_lock(store):
+        new_file = not store.patches.exists() or store.patches.stat().st_size == 0
+        patches[["op"] + ORDER_COLS].to_csv(store.patches, mode="a", header=new_file, index=False,
+                                            encoding="utf-8-sig" if new_file else "utf-8")
+        with open(store.patches, "rb") as f:
+            pending = sum(1 for _ in f) - 1
+    _snap(store).refresh("orders")
+    name = f"orders-compactor:{store.root}"
+    if pending >= ORDERS_COMPACT_AT and not any(t.name == name for t in threading.enumerate()):
+        threading.Thread(target=compact_orders, args=(store,), name=name, daemon=True).start()
+
+def save_order_edits(df, store=None):
+    df = df[ORDER_COLS].copy()
+    df.insert(0, "op", "put")
+    _append_order_patches(df, _store(store))
+
+def delete_orders(order_ids, store=None):
+    df = pd.DataFrame({"op": "del", "order_id": pd.Series(order_ids, dtype=object).astype(str).to_numpy()}, columns=["op"] + ORDER_COLS)
+    if not df.empty:
+        _append_order_patches(df, _store(store))
+
+def _mispriced(orders, d_from, d_to, products):
+    # hashed join of the chosen lines against the current catalog; keeps only lines whose price changes
+    catalog = load_products().drop_duplicates(subset=["product"]).set_index("product")["price"]
+    sel = (orders["date"] >= pd.to_datetime(d_from)) & (orders["date"] <= pd.to_datetime(d_to)) & orders["product"].isin(products)
+    lines = orders[sel]
+    price = lines["product"].map(catalog)
+    hit = price.notna() & ((price - lines["unit_price"]).abs() > 1e-9)
+    lines, price = lines[hit], price[hit]
+    return lines.assign(old_unit_price=lines["unit_price"], old_total=lines["total"], unit_price=price, total=lines["qty"] * price)
+
+def reprice_preview(d_from, d_to, products, store=None):
+    return pd.concat([_mispriced(load_orders(s), d_from, d_to, products) for s in _active(store)], ignore_index=True)
+
+def reprice_orders(d_from, d_to, products, store=None):
+    # recomputed lines go out as "put" patches, one append per shard
+    n = 0
+    for s in _active(store):
+        with _orders_lock(s):
+            _snap(s).refresh("orders")
+            lines = _mispriced(_snap(s).get("orders"), d_from, d_to, products)
+            if not lines.empty:
+                save_order_edits(lines, s)
+        n += len(lines)
+    return n
+
+def compact_orders(store=None):
+    # folds the patch log into orders.csv; appends wait on the lock meanwhile
+    store = _store(store)
+    with _orders_lock(store):
+        patches = _read_order_patches(store)
+        if patches.empty:
+            return
+        df = _apply_order_patches(_read_orders_base(store), patches)
+        _write_csv_atomic(df[ORDER_COLS], store.orders)
+        store.patches.unlink(missing_ok=True)
+    _snap(store).refresh("orders")
+
+# ---------------- Archive (closed school years) ----------------
+def _school_year(d):
+    d = pd.Timestamp(d)
+    return d.year if d.month >= 9 else d.year - 1
+
+def _read_archive_manifest(store):
+    if store.manifest.exists():
+        with open(store.manifest, encoding="utf-8") as f:
+            return json.load(f).get("parts", [])
+    return []
+
+def archive_manifest(store=None):
+    # one entry per archived school year, row counts summed over the shards in view
+    parts = {}
+    for s in _active(store):
+        for p in _data_snapshot(str(s.root)).get("archive"):
+            parts.setdefault(p["file"], dict(p, rows=0))["rows"] += p["rows"]
+    return sorted(parts.values(), key=lambda p: p["from"])
+
+@st.cache_resource(max_entries=16)
+def _read_archive_part(path, mtime_ns):
+    return _normalize_orders(pd.read_parquet(path))
+
+def with_archived_orders(orders, d_from, d_to, store=None):
+    # adds archived lines only when the selected range reaches into an archived school year
+    frames = [orders]
+    for s in _active(store):
+        for part in _data_snapshot(str(s.root)).get("archive"):
+            if part["from"] <= str(d_to) and part["to"] >= str(d_from):
+                path = s.archive / part["file"]
+                if path.exists():
+                    frames.append(_read_archive_part(str(path), path.stat().st_mtime_ns))
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def _write_archive(lines, store):
+    # merges dated lines into the store's per-school-year parts and manifest; the caller holds the orders lock
+    years = lines["date"].dt.year - (lines["date"].dt.month < 9)
+    lines, years = lines[years.notna()], years[years.notna()].astype(int)
+    store.archive.mkdir(parents=True, exist_ok=True)
+    parts = {p["file"]: p for p in _read_archive_manifest(store)}
+    for y, g in lines.groupby(years):
+        name = f"orders_{y}-{y+1}.parquet"
+        path = store.archive / name
+        if path.exists():
+            g = pd.concat([_normalize_orders(pd.read_parquet(path)), g], ignore_index=True)
+            g = g.drop_duplicates(subset=["order_id"], keep="last")
+        g = g.sort_values("date")
+        tmp = path.with_name(f"{name}.{os.getpid()}.tmp")
+        g[ORDER_COLS].to_parquet(tmp, compression="zstd", index=False)
+        os.replace(tmp, path)
+        parts[name] = {"file": name, "from": f"{y}-09-01", "to": f"{y+1}-08-31", "rows": int(len(g))}
+    tmp = store.manifest.with_name(f"{store.manifest.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"parts": sorted(parts.values(), key=lambda p: p["from"])}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, store.manifest)
+
+def archive_orders(last_year, store=None):
+    # moves every line up to and including school year `last_year` (Sept–Aug) into archive/orders_<year>.parquet
+    store = _store(store)
+    with _orders_lock(store):
+        live = _read_orders(store)
+        years = live["date"].dt.year - (live["date"].dt.month < 9)
+        old = years.notna() & (years <= last_year)
+        if not old.any():
+            return 0
+        _write_archive(live[old], store)
+        save_orders(live[~old], store)
+    _snap(store).refresh("archive")
+    return int(old.sum())
+
+# ---------------- Request ingestion (requests.jsonl) ----------------
+def _read_offset(store=None):
+    # "<offset> <st_dev> <st_ino>": the file identity tells whether requests.jsonl was replaced since
+    try:
+        parts = _store(store).requests_offset.read_text().split()
+        return (int(parts[0]) if parts else 0), (tuple(int(x) for x in parts[1:3]) or None)
+    except (OSError, ValueError):
+        return 0, None
+
+def _roster_match_frame(roster):
+    parts = roster["key"].str.split("|", n=2, expand=True).reindex(columns=[0, 1, 2])
+    return pd.DataFrame({"student_k": parts[0], "school_k": parts[1], "class_k": parts[2],
+                         "student_r": roster["student"], "school_r": roster["school"], "class_r": roster["class"]})
+
+def _match_students(req, store):
+    # hashed join on the normalised name; school/class narrow the match only when the request gives them
+    roster = _snap(store).derived("students", "match", _roster_match_frame)
+    q = pd.DataFrame({"student_k": req["student"].map(_fold), "school_k": req["school"].map(_fold),
+                      "class_k": req["class"].map(_fold)}, index=req.index)
+    m = q.reset_index().merge(roster, on="student_k", how="inner", suffixes=("", "_roster"))
+    m = m[((m["school_k"] == "") | (m["school_k"] == m["school_k_roster"])) & ((m["class_k"] == "") | (m["class_k"] == m["class_k_roster"]))]
+    n = m.groupby("index").size().reindex(req.index, fill_value=0)
+    hit = m.drop_duplicates(subset=["index"]).set_index("index")[["student_r","school_r","class_r"]].reindex(req.index)
+    return hit["student_r"], hit["school_r"], hit["class_r"], n
+
+def ingest_requests(max_bytes=INGEST_MAX_BYTES, store=None):
+    # one batch: validate and price vectorised, append accepted lines in one write, then advance the offset
+    store = _store(store)
+    stats = {"read": 0, "accepted": 0, "rejected": 0, "duplicates": 0}
+    with _orders_lock(store):
+        if not store.requests.exists():
+            return stats
+        offset, ident = _read_offset(store)
+        with open(store.requests, "rb") as f:
+            fst = os.fstat(f.fileno())
+            if fst.st_size < offset or (ident is not None and ident != (fst.st_dev, fst.st_ino)):
+                offset = 0  # truncated, rotated or replaced
+            f.seek(offset)
+            chunk = f.read(max_bytes)
+            end = chunk.rfind(b"\n") + 1
+            if end == 0 and len(chunk) == max_bytes:
+                # a single line longer than max_bytes: find its end so it can be rejected and skipped
+                pos = offset + len(chunk)
+                while block := f.read(1 << 20):
+                    nl = block.find(b"\n")
+                    if nl >= 0:
+                        end = pos + nl + 1 - offset
+                        break
+                    pos += len(block)
+        if end == 0:
+            return stats  # nothing complete yet
+        recs, rejects = [], []
+        if end > len(chunk):
+            lines, offs = [], []
+            rejects.append({"offset": offset, "line": chunk[:200].decode("utf-8", "replace") + "…",
+                            "reason": f"γραμμή μεγαλύτερη από {max_bytes} bytes"})
+        else:
+            lines = chunk[:end].split(b"\n")[:-1]
+            offs = list(accumulate((len(l) + 1 for l in lines[:-1]), initial=offset))
+        for o, raw in zip(offs, lines):
+            if not raw.strip():
+                continue
+            try:
+                r = json.loads(raw)
+                if not isinstance(r, dict): raise ValueError
+            except ValueError:
+                rejects.append({"offset": o, "line": raw.decode("utf-8", "replace"), "reason": "μη έγκυρο JSON"})
+                continue
+            r["_offset"], r["_raw"] = o, raw
+            recs.append(r)
+        stats["read"] = len(recs) + len(rejects)
+
+        if recs:
+            req = pd.DataFrame.from_records(recs)
+            for c in ["request_id","date","student","school","class","product","qty"]:
+                if c not in req.columns: req[c] = pd.NA
+            for c in ["student","school","class","product"]:
+                req[c] = req[c].fillna("").astype(str).str.strip()
+            products = load_products()
+            price = req["product"].map(dict(zip(products["product"], products["price"])))
+            qty = pd.to_numeric(req["qty"].fillna(1), errors="coerce")
+            when = pd.to_datetime(req["date"].fillna(str(date.today())), errors="coerce", format="ISO8601")
+            student, school, cls, n = _match_students(req, store)
+
+            reason = pd.Series("", index=req.index)
+            for bad, why in [
+                (req["student"] == "", "λείπει μαθητής/-τρια"),
+                (price.isna(), "άγνωστο προϊόν"),
+                (qty.isna() | (qty < 1) | (qty != qty.round()), "μη έγκυρη ποσότητα"),
+                (when.isna(), "μη έγκυρη ημερομηνία"),
+                (n == 0, "άγνωστος/-η μαθητής/-τρια"),
+                (n > 1, "ασαφής μαθητής/-τρια (δώσε σχολείο/τάξη)"),
+            ]:
+                reason = reason.mask(bad & (reason == ""), why)
+
+            rid = req["request_id"].fillna("").astype(str).str.strip()
+            fallback = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{o}:{raw!r}")) for o, raw in zip(req["_offset"], req["_raw"])]
+            req["order_id"] = rid.where(rid != "", pd.Series(fallback, index=req.index))
+
+            ok = reason == ""
+            accepted = pd.DataFrame({
+                "order_id": req["order_id"], "date": when.dt.normalize(),
+                "student": student, "school": school, "class": cls, "product": req["product"],
+                "qty": qty, "unit_price": price, "total": qty * price,
+            })[ok]
+            _snap(store).refresh("orders")
+            known = set(_snap(store).get("orders")["order_id"])
+            fresh = ~accepted["order_id"].isin(known) & ~accepted["order_id"].duplicated()
+            stats["duplicates"] = int((~fresh).sum())
+            accepted = accepted[fresh].astype({"qty": int})
+            if not accepted.empty:
+                append_orders(accepted, store)
+            stats["accepted"] = int(len(accepted))
+            for o, raw, why in zip(req.loc[~ok, "_offset"], req.loc[~ok, "_raw"], reason[~ok]):
+                rejects.append({"offset": int(o), "line": raw.decode("utf-8", "replace"), "reason": why})
+
+        if rejects:
+            with open(store.requests_rejects, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rejects))
+        stats["rejected"] = len(rejects)
+        tmp = store.requests_offset.with_name(f"{store.requests_offset.name}.{os.getpid()}.tmp")
+        tmp.write_text(f"{offset + end} {fst.st_dev} {fst.st_ino}")
+        os.replace(tmp, store.requests_offset)
+    return stats
+
+@st.cache_resource
+def _ingest_worker():
+    # one thread for the whole process; it re-lists the shards on every pass, so new schools are picked up
+    totals = {}
+
+    def _loop():
+        seen = {}
+        while True:
+            busy = False
+            for root in _data_roots():
+                store = DataStore(root)
+                t = totals.setdefault(str(root), {"accepted": 0, "rejected": 0, "duplicates": 0, "last": None, "error": None})
+                try:
+                    sig = (store.requests.stat().st_size, store.requests.stat().st_mtime_ns) if store.requests.exists() else None
+                    if sig is not None and sig != seen.get(root):
+                        r = ingest_requests(store=store)
+                        for k in ["accepted", "rejected", "duplicates"]:
+                            t[k] += r[k]
+                        if r["read"]:
+                            t["last"] = pd.Timestamp.now().strftime("%H:%M:%S")
+                            busy = True  # keep draining
+                            continue
+                        seen[root] = sig
+                    t["error"] = None
+                except Exception as e:
+                    t["error"] = repr(e)
+            if not busy:
+                time.sleep(INGEST_POLL_SECONDS)
+
+    if INGEST_REQUESTS:
+        threading.Thread(target=_loop, name="requests-ingest", daemon=True).start()
+    return totals
+
+def _append_csv(path, df, cols):
+    # appends rows in place; returns False when the file is missing or has other columns so the caller rewrites it
+    if not path.exists() or path.stat().st_size == 0:
+        return False
+    with open(path, encoding="utf-8-sig") as f:
+        header = [h.strip() for h in f.readline().strip().split(",")]
+    if header != cols:
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        needs_nl = f.read(1) != b"\n"
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        if needs_nl: f.write("\n")
+        df[cols].to_csv(f, header=False, index=False, lineterminator="\n")
+    return True
+
+# ---------------- School shards ----------------
+def shard_school(store=None):
+    # the school as written in the shard's own data; the directory name is mangled for "" and "/"
+    for name in ["students", "orders"]:
+        vals = _snap(store).get(name)["school"]
+        if len(vals):
+            return vals.mode().iloc[0]
+    name = _store(store).root.name
+    return "" if name == _shard_dir("").name else name
+
+def _foreign_schools(schools, store=None):
+    # schools whose shard already exists and is not `store`; always empty in the single-directory layout
+    root = _store(store).root
+    if root.parent != SCHOOLS_DIR:
+        return []
+    return sorted({x for x in schools if _shard_dir(x).name != root.name and _shard_dir(x).is_dir()})
+
+def _new_schools(schools, store=None):
+    # schools with no shard yet; adding students to one creates schools/<school>/
+    root = _store(store).root
+    if root.parent != SCHOOLS_DIR:
+        return []
+    return sorted({x for x in schools if not _shard_dir(x).is_dir()})
+
+def new_school_store(school):
+    path = _shard_dir(school)
+    path.mkdir(parents=True, exist_ok=True)
+    return DataStore(path)
+
+def shard_by_school():
+    # splits the root roster, orders and archive into schools/<school>/; the root files are kept as *.pre-shard
+    root = DataStore(DATA_DIR)
+    with _orders_lock(root):
+        # unread requests in the root queue become orders first; after the split only schools/*/requests.jsonl are read
+        while INGEST_REQUESTS and ingest_requests(store=root)["read"]:
+            pass
+        students, orders = _read_students(root), _read_orders(root)
+        parts = [root.archive / p["file"] for p in _read_archive_manifest(root)]
+        archived = [_normalize_orders(pd.read_parquet(p)) for p in parts if p.exists()]
+        archived = pd.concat(archived, ignore_index=True) if archived else orders.iloc[:0]
+        dirs = [df["school"].map(lambda x: _shard_dir(x).name) for df in (students, orders, archived)]
+        shards = sorted(set().union(*dirs))
+        for d in shards:
+            shard = DataStore(SCHOOLS_DIR / d)
+            shard.root.mkdir(parents=True, exist_ok=True)
+            _write_csv_atomic(students.loc[dirs[0] == d, ["student","school","class"]], shard.students)
+            with _orders_lock(shard):
+                _write_csv_atomic(orders.loc[dirs[1] == d, ORDER_COLS], shard.orders)
+                if (dirs[2] == d).any():
+                    _write_archive(archived[dirs[2] == d], shard)
+        for path in [root.students, root.orders, root.patches, root.manifest, root.requests, root.requests_offset]:
+            if path.exists():
+                os.replace(path, path.with_name(path.name + ".pre-shard"))
+    _data_snapshot(str(DATA_DIR)).refresh()
+    return len(shards)
+
+# ---------------- Excel import (streaming) ----------------
+def _cell(v):
+    return "" if v is None else str(v).strip()
+
+def _price(v):
+    # None for a blank or unparseable cell, so a merge keeps the current price instead of zeroing it
+    p = pd.to_numeric(v, errors="coerce")
+    return None if pd.isna(p) else float(p)
+
+def _xlsx_rows(upl, aliases, width, required):
+    # reads every sheet row by row; the header row picks the columns (by alias) or the first `width` columns.
+    # only the first `required` names of an alias set must be present, missing optional columns come out as None
+    from openpyxl import load_workbook
+    wb = load_workbook(upl, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            heads = [_cell(h).lower() for h in header]
+            pos = None
+            for names in aliases:
+                if all(n in heads for n in names[:required]):
+                    pos = [heads.index(n) if n in heads else None for n in names]
+                    break
+            if pos is None:
+                pos = list(range(min(width, len(heads)))) + [None] * max(0, width - len(heads))
+            for r in rows:
+                yield tuple(r[i] if i is not None and i < len(r) else None for i in pos)
+    finally:
+        wb.close()
+
+def import_products_xlsx(upl, replace=False):
+    current = load_products()
+    cur = dict(zip(current["product"], current["price"]))
+    seen = {}
+    for name, price in _xlsx_rows(upl, [("προϊόν", "τιμή"), ("product", "price")], 2, 2):
+        name = _cell(name)
+        if name and name not in seen:
+            seen[name] = _price(price)
+    inserts = [k for k in seen if k not in cur]
+    updates = {k: v for k, v in seen.items() if k in cur and v is not None and abs(cur[k] - v) > 1e-9}
+    deletes = {k for k in cur if k not in seen} if replace else set()
+    if inserts and not updates and not deletes:
+        add = pd.DataFrame({"product": inserts, "price": [seen[k] or 0.0 for k in inserts]})
+        if _append_csv(PRODUCTS_PATH, add, ["product","price"]):
+            _data_snapshot(str(DATA_DIR)).refresh("products")
+            return len(inserts), 0, 0
+    if inserts or updates or deletes:
+        df = current[~current["product"].isin(deletes)].copy()
+        df["price"] = df["product"].map(updates).fillna(df["price"])
+        add = pd.DataFrame({"product": inserts, "price": [seen[k] or 0.0 for k in inserts]})
+        save_products(pd.concat([df, add], ignore_index=True))
+    return len(inserts), len(updates), len(deletes)
+
+def import_students_xlsx(upl, replace=False, store=None):
+    store = _store(store)
+    current = load_students(store)
+    index = student_key_index(store)
+    seen = {}
+    aliases = [("ονοματεπώνυμο", "σχολείο", "τάξη"), ("student", "school", "class")]
+    for r in _xlsx_rows(upl, aliases, 3, 1):
+        row = tuple(_cell(v) for v in r)
+        if row[0]:
+            seen.setdefault(_student_key(*row), row)
+    schools = {row[1] for row in seen.values()}
+    foreign = _foreign_schools(schools, store)
+    if foreign:
+        raise ValueError("σχολεία άλλου φακέλου: " + ", ".join(x or "—" for x in foreign))
+    created = 0
+    for school in _new_schools(schools, store):
+        rows = [row for row in seen.values() if _shard_dir(row[1]).name == _shard_dir(school).name]
+        if rows:
+            add_students(pd.DataFrame(rows, columns=["student","school","class"]), new_school_store(school))
+            created += len(rows)
+            seen = {k: row for k, row in seen.items() if _shard_dir(row[1]).name != _shard_dir(school).name}
+    inserts = [row for k, row in seen.items() if k not in index]
+    deletes = index - seen.keys() if replace else set()
+    add = pd.DataFrame(inserts, columns=["student","school","class"])
+    if inserts and not deletes:
+        add_students(add, store)
+    elif deletes:
+        save_students(pd.concat([current[~current["key"].isin(deletes)], add], ignore_index=True), store)
+    return len(inserts) + created, len(deletes)
 
 # ---------------- PDF helpers ----------------
 def _draw_header_with_logo(c, title):
@@ -196,27 +812,75 @@ def _paginate_new_page(c, title, app_url):
     c.showPage()
     return _draw_header_with_logo(c, title)
 
+@lru_cache(maxsize=1 << 16)
+def _text_width(s, font, size):
+    return pdfmetrics.stringWidth(s, font, size)
+
+def _fmt_money(col):
+    return pd.to_numeric(col, errors="coerce").fillna(0.0).map("{:.2f}".format)
+
+def _fmt_qty(col):
+    q = pd.to_numeric(col, errors="coerce")
+    return q.fillna(0).astype(int).astype(str).where(q.notna(), "")
+
+def _pdf_column(cells, x, align="L", size=9, width=None):
+    # a whole column formatted once: its strings and, when right-aligned, where each one starts
+    cells = cells.astype(str).str.replace("\n", " ", regex=False)
+    if width:
+        cells = cells.str[:width]
+    cells = cells.tolist()
+    xs = [x - _text_width(s, FONT_REG, size) for s in cells] if align == "R" else None
+    return x, cells, xs
+
+def _rows_fitting(y, step, bottom=2*cm):
+    return int((y - bottom) // step) + 1 if y >= bottom else 0
+
+def _draw_rows(c, y, step, cols, lo, hi, size=9):
+    # rows lo..hi of preformatted columns in a single text object instead of one drawString per cell
+    t = c.beginText()
+    t.setFont(FONT_REG, size, leading=step)
+    for x, cells, xs in cols:
+        if xs is None:
+            t.setTextOrigin(x, y)
+            t.textLines(cells[lo:hi])
+        else:
+            for k in range(lo, hi):
+                t.setTextOrigin(xs[k], y - (k - lo)*step)
+                t.textOut(cells[k])
+    c.drawText(t)
+    return y - (hi - lo)*step
+
 def pdf_grouped_by_school_student(df, title="Δελτίο"):
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     left = 2*cm
     right = width - 2*cm
+    step = 0.35*cm
 
     y = _draw_header_with_logo(c, title)
+    cls_of = df.groupby(["school","student"])["class"].first()
+    df = df.sort_values(["school","student","product"], kind="stable")
+    cols = [_pdf_column(df["product"], left),
+            _pdf_column(_fmt_money(df["unit_price"]), right-6.5*cm, "R"),
+            _pdf_column(_fmt_qty(df["qty"]), right-3.5*cm, "R"),
+            _pdf_column(_fmt_money(df["total"]), right-0.5*cm, "R")]
+    by = df.assign(total=pd.to_numeric(df["total"], errors="coerce").fillna(0.0)).groupby(["school","student"], sort=False)
+    groups = pd.DataFrame({"n": by.size(), "subtotal": by["total"].sum()})
+    groups = groups.assign(cls=cls_of.reindex(groups.index)).reset_index()
     grand_total = 0.0
+    pos = 0
 
-    for school, g1 in df.groupby("school"):
+    for school, g1 in groups.groupby("school", sort=False):
         if y < 3*cm: y = _paginate_new_page(c, title, app_url)
         c.setFont(FONT_BLD, 12)
         c.drawString(left, y, f"Σχολείο: {school or '—'}")
         y -= 0.6*cm
 
-        school_total = 0.0
-        for student, g2 in g1.groupby("student"):
+        for student, n, cls, subtotal in zip(g1["student"], g1["n"], g1["cls"], g1["subtotal"]):
             if y < 3*cm: y = _paginate_new_page(c, title, app_url)
             c.setFont(FONT_BLD, 11)
-            cls = (g2["class"].iloc[0] or "").strip()
+            cls = (cls or "").strip()
             suffix = f" — Τάξη: {cls}" if cls else ""
             c.drawString(left, y, f"Μαθητής/-τρια: {student}{suffix}")
             y -= 0.5*cm
@@ -227,25 +891,20 @@ def pdf_grouped_by_school_student(df, title="Δελτίο"):
             c.drawRightString(right-3.5*cm, y, "Ποσότητα")
             c.drawRightString(right-0.5*cm, y, "Σύνολο (€)")
             y -= 0.4*cm
-            c.setFont(FONT_REG, 9)
 
-            subtotal = 0.0
-            for _, row in g2.sort_values(["product"]).iterrows():
+            end = pos + n
+            while pos < end:
                 if y < 2*cm: y = _paginate_new_page(c, title, app_url)
-                c.drawString(left, y, str(row["product"]))
-                c.drawRightString(right-6.5*cm, y, f"{float(row['unit_price'] or 0):.2f}")
-                c.drawRightString(right-3.5*cm, y, f"{int(row['qty']) if pd.notna(row['qty']) else ''}")
-                c.drawRightString(right-0.5*cm, y, f"{float(row['total'] or 0):.2f}")
-                y -= 0.35*cm
-                subtotal += float(row.get("total", 0) or 0)
+                hi = min(end, pos + _rows_fitting(y, step))
+                y = _draw_rows(c, y, step, cols, pos, hi)
+                pos = hi
 
             if y < 2*cm: y = _paginate_new_page(c, title, app_url)
             c.setFont(FONT_BLD, 10)
             c.drawRightString(right-0.5*cm, y, f"Σύνολο {student}: {subtotal:.2f} €")
             y -= 0.5*cm
-            c.setFont(FONT_REG, 9)
-            school_total += subtotal
 
+        school_total = float(g1["subtotal"].sum())
         if y < 2*cm: y = _paginate_new_page(c, title, app_url)
         c.setFont(FONT_BLD, 11)
         c.drawRightString(right-0.5*cm, y, f"Σύνολο Σχολείου: {school_total:.2f} €")
@@ -268,6 +927,7 @@ def pdf_products_report(df, title="Παραγγελία προς κατάστη
     width, height = A4
     left = 2*cm
     right = width - 2*cm
+    step = 0.4*cm
 
     y = _draw_header_with_logo(c, title)
     c.setFont(FONT_BLD, 10)
@@ -276,13 +936,15 @@ def pdf_products_report(df, title="Παραγγελία προς κατάστη
     c.drawRightString(right-0.5*cm, y, "Σύνολο (€)")
     y -= 0.5*cm
 
-    c.setFont(FONT_REG, 10)
-    for _, row in df.iterrows():
-        if y < 2*cm: y = _paginate_new_page(c, title, app_url)
-        c.drawString(left, y, str(row["product"]))
-        c.drawRightString(right-3*cm, y, f"{int(row['qty'])}")
-        c.drawRightString(right-0.5*cm, y, f"{float(row['total']):.2f}")
-        y -= 0.4*cm
+    cols = [_pdf_column(df["product"], left, size=10),
+            _pdf_column(_fmt_qty(df["qty"]), right-3*cm, "R", size=10),
+            _pdf_column(_fmt_money(df["total"]), right-0.5*cm, "R", size=10)]
+    pos = 0
+    while pos < len(df):
+        if pos: y = _paginate_new_page(c, title, app_url)
+        hi = min(len(df), pos + _rows_fitting(y, step))
+        y = _draw_rows(c, y, step, cols, pos, hi, size=10)
+        pos = hi
 
     _draw_footer(c, c.getPageNumber(), app_url)
     c.showPage()
@@ -297,34 +959,33 @@ def pdf_table(df, title="Αναφορά", columns=None):
     left = 2*cm
     right = width - 2*cm
 
-    y = _draw_header_with_logo(c, title)
+    def _heads(y):
+        c.setFont(FONT_BLD, 9)
+        for i, (_c, head, _a) in enumerate(cols):
+            c.drawString(left + i*step, y, str(head)[:22])
+        return y - 0.45*cm
+
     cols = columns or [(col, col, "L") for col in df.columns]
-    c.setFont(FONT_BLD, 9)
     step = (right-left) / max(1, len(cols))
-    for i, (_c, head, _a) in enumerate(cols):
-        c.drawString(left + i*step, y, str(head)[:22])
-    y -= 0.45*cm
-    c.setFont(FONT_REG, 9)
+    y = _heads(_draw_header_with_logo(c, title))
+
+    # "Σύνολο" columns print as money; each column is formatted in one pass
+    cells = []
+    for i, (col_key, head, align) in enumerate(cols):
+        col = df[col_key]
+        if "σύνολο" in str(head).lower() and pd.api.types.is_numeric_dtype(col):
+            col = col.map("{:.2f}".format)
+        if align == "R":
+            cells.append(_pdf_column(col, left + (i+1)*step - 2, "R", width=22))
+        else:
+            cells.append(_pdf_column(col, left + i*step, width=26))
 
-    for _, row in df.iterrows():
-        if y < 2*cm:
-            y = _paginate_new_page(c, title, app_url)
-            c.setFont(FONT_BLD, 9)
-            for i, (_c, head, _a) in enumerate(cols):
-                c.drawString(left + i*step, y, str(head)[:22])
-            y -= 0.45*cm
-            c.setFont(FONT_REG, 9)
-        for i, (col_key, _head, align) in enumerate(cols):
-            val = row[col_key]
-            if isinstance(val, (float, int)) and ("σύνολο" in _head.lower()):
-                s = f"{float(val):.2f}"
-            else:
-                s = f"{val}"
-            if align == "R":
-                c.drawRightString(left + (i+1)*step - 2, y, s[:22])
-            else:
-                c.drawString(left + i*step, y, s[:26])
-        y -= 0.38*cm
+    pos = 0
+    while pos < len(df):
+        if pos: y = _heads(_paginate_new_page(c, title, app_url))
+        hi = min(len(df), pos + _rows_fitting(y, 0.38*cm))
+        y = _draw_rows(c, y, 0.38*cm, cells, pos, hi)
+        pos = hi
 
     _draw_footer(c, c.getPageNumber(), app_url)
     c.showPage()
@@ -332,13 +993,213 @@ def pdf_table(df, title="Αναφορά", columns=None):
     buffer.seek(0)
     return buffer
 
+# ---------------- Shared snapshot & file watcher ----------------
+class _DataSnapshot:
+    # one parsed copy of each data file per process; `version` changes whenever any of them is reloaded
+    def __init__(self, sources):
+        self.sources = sources
+        self.frames, self.sigs, self.extra = {}, {}, {}
+        self.version = 0
+        self.watcher = "—"
+        self.lock = threading.Lock()
+
+    def _sig(self, name):
+        return tuple((p.stat().st_mtime_ns, p.stat().st_size) if p.exists() else None for p in self.sources[name][1])
+
+    def _load(self, name):
+        sig = self._sig(name)
+        self.frames[name] = self.sources[name][0]()
+        self.sigs[name] = sig
+        self.version += 1
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.frames:
+                self._load(name)
+            return self.frames[name]
+
+    def derived(self, name, key, fn):
+        # memoised per loaded frame, e.g. hash indexes built from it
+        frame = self.get(name)
+        with self.lock:
+            hit = self.extra.get((name, key))
+            if hit is None or hit[0] is not frame:
+                hit = (frame, fn(frame))
+                self.extra[(name, key)] = hit
+            return hit[1]
+
+    def refresh(self, name=None):
+        with self.lock:
+            for n in ([name] if name else list(self.frames)):
+                if n in self.frames and self._sig(n) != self.sigs.get(n):
+                    self._load(n)
+
+class _Watcher:
+    # one observer and one refresh thread for every snapshot in the process; watchdog runs one emitter
+    # (and inotify instance) per scheduled directory, so all shards share a single recursive watch on schools/;
+    # any other root gets two flat watches, itself and its archive/ (a recursive one would also cover schools/)
+    def __init__(self):
+        self.snaps, self.watched, self.dirs = [], set(), set()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.obs = None
+        self.timeout = WATCH_POLL_SECONDS
+        if Observer is not None:
+            try:
+                self.obs = Observer()
+                self.obs.daemon = True
+                self.obs.start()
+                self.timeout = 30
+            except Exception:
+                self.obs = None
+        threading.Thread(target=self._loop, name="data-watcher", daemon=True).start()
+
+    def add(self, snap, root):
+        with self.lock:
+            self.watched |= {os.path.abspath(p) for _, paths in snap.sources.values() for p in paths}
+            self.snaps.append(snap)
+        root = Path(root)
+        if root.parent == SCHOOLS_DIR:
+            targets = [(SCHOOLS_DIR, True)]
+        else:
+            DataStore(root).archive.mkdir(parents=True, exist_ok=True)
+            targets = [(root, False), (DataStore(root).archive, False)]
+        if self.obs is not None:
+            watcher = self
+
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    # the observer watches absolute paths, so event paths are already absolute
+                    if {os.fsdecode(event.src_path), os.fsdecode(getattr(event, "dest_path", "") or "")} & watcher.watched:
+                        watcher.wake.set()
+            try:
+                for target, recursive in targets:
+                    target = os.path.abspath(target)
+                    if target not in self.dirs:
+                        self.obs.schedule(_Handler(), target, recursive=recursive)
+                        self.dirs.add(target)
+                snap.watcher = "inotify"
+                return
+            except Exception:
+                self.timeout = WATCH_POLL_SECONDS  # e.g. out of inotify watches: poll everything
+        snap.watcher = f"polling {WATCH_POLL_SECONDS}s"
+
+    def _loop(self):
+        while True:
+            self.wake.wait(self.timeout)
+            time.sleep(0.1)  # let the writer finish
+            self.wake.clear()
+            with self.lock:
+                snaps = list(self.snaps)
+            for snap in snaps:
+                try:
+                    snap.refresh()
+                except Exception:
+                    pass
+
+@st.cache_resource
+def _watcher():
+    return _Watcher()
+
+@st.cache_resource
+def _data_snapshot(root):
+    # one snapshot per data directory, so a session only ever parses the shard(s) it looks at
+    store = DataStore(root)
+    sources = {
+        "students": (lambda: _read_students(store), [store.students]),
+        "orders":   (lambda: _read_orders(store), [store.orders, store.patches]),
+        "archive":  (lambda: _read_archive_manifest(store), [store.manifest]),
+    }
+    if store.root == DATA_DIR:
+        sources["products"] = (_read_products, [PRODUCTS_PATH])
+    snap = _DataSnapshot(sources)
+    _watcher().add(snap, root)
+    return snap
+
+def _data_version():
+    # changes whenever any snapshot this session reads from is reloaded
+    return sum(_data_snapshot(str(root)).version for root in {DATA_DIR, *(s.root for s in _active())})
+
+def _live_refresh():
+    # cheap in-memory version check; reruns the page only when the data actually changed
+    if st.session_state.get("data_version") != _data_version():
+        st.rerun()
+
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+if _fragment is not None:
+    _live_refresh = _fragment(run_every=1)(_live_refresh)
+
+# ---------------- Diagnostics (sidebar) ----------------
+with st.sidebar.expander("🔍 Διαγνωστικά"):
+    try:
+        for path in [PRODUCTS_PATH] + [p for s in _active() for p in (s.students, s.orders, s.patches)]:
+            ok = path.exists()
+            size = (path.stat().st_size if ok else 0)
+            st.write(f"- {path}: {'✅' if ok else '❌'} ({size} bytes)")
+        st.write(f"Προϊόντα: {len(load_products())} • Μαθητές/τριες: {len(load_students())} • Γραμμές παραγγελιών: {len(load_orders())}")
+        st.write(f"Έκδοση δεδομένων: {_data_version()} • Παρακολούθηση: {_data_snapshot(str(DATA_DIR)).watcher}")
+        if SHARDS: st.write(f"Σχολεία (shards): {len(SHARDS)} • Ενεργά: {len(_active())}")
+        st.write("Ρόλος:", role, "| Admin:", is_admin)
+    except Exception as e:
+        st.write("Σφάλμα:", e)
+
+# ---------------- Archive (sidebar) ----------------
+if is_admin and STORE is not None:
+    with st.sidebar.expander("🗄️ Αρχειοθέτηση"):
+        for p in archive_manifest():
+            st.write(f"- {p['from'][:4]}-{p['to'][:4]}: {p['rows']} γραμμές")
+        _live = _snap().get("orders")["date"]
+        _closed = sorted({int(y) for y in (_live.dt.year - (_live.dt.month < 9)).dropna().unique() if y < _school_year(date.today())})
+        if _closed:
+            last_year = st.selectbox("Έως και σχολικό έτος", _closed, index=len(_closed)-1, format_func=lambda y: f"{y}-{y+1}", key="archive_year")
+            if st.button("🗄️ Αρχειοθέτηση κλειστών ετών", key="archive_btn"):
+                n = archive_orders(last_year)
+                st.success(f"Αρχειοθετήθηκαν {n} γραμμές.")
+                st.rerun()
+        else:
+            st.caption("Δεν υπάρχουν κλειστά σχολικά έτη στα τρέχοντα δεδομένα.")
+
+# ---------------- Request ingestion (sidebar) ----------------
+# one worker serves every shard's requests.jsonl, whichever school this session is looking at
+_ingest_totals = _ingest_worker()
+if is_admin and STORE is not None:
+    _ingest = _ingest_totals.get(str(STORE.root)) or {"accepted": 0, "rejected": 0, "duplicates": 0, "last": None, "error": None}
+    with st.sidebar.expander("📥 Αιτήματα από requests.jsonl"):
+        st.write(f"Καταχωρίστηκαν: {_ingest['accepted']} • Απορρίφθηκαν: {_ingest['rejected']} • Διπλότυπα: {_ingest['duplicates']}")
+        st.write(f"Θέση ανάγνωσης: {_read_offset()[0]} / {STORE.requests.stat().st_size if STORE.requests.exists() else 0} bytes")
+        if _ingest["last"]: st.caption(f"Τελευταία παρτίδα: {_ingest['last']}")
+        if _ingest["error"]: st.error(_ingest["error"])
+        if not INGEST_REQUESTS: st.caption("Η αυτόματη εισαγωγή είναι απενεργοποιημένη — ενεργοποιείται με INGEST_REQUESTS=1.")
+        if STORE.requests_rejects.exists():
+            st.download_button("⬇️ Απορριφθέντα (JSONL)", data=STORE.requests_rejects.read_bytes(), file_name="requests_rejects.jsonl", mime="application/jsonl")
+
+# ---------------- School shards (sidebar) ----------------
+if is_admin and SHARDS and DataStore(DATA_DIR).requests.exists():
+    st.sidebar.warning("Υπάρχει requests.jsonl στη ρίζα: σε διαχωρισμό ανά σχολείο δεν διαβάζεται. "
+                       "Τα kiosks πρέπει να γράφουν στο schools/<σχολείο>/requests.jsonl.")
+if is_admin and not SHARDS:
+    with st.sidebar.expander("🏫 Διαχωρισμός ανά σχολείο"):
+        st.caption("Ένας φάκελος schools/<σχολείο>/ ανά σχολείο: κάθε συνεδρία φορτώνει μόνο τα δεδομένα του σχολείου της. "
+                   "Τα αρχικά αρχεία κρατιούνται ως *.pre-shard.")
+        if STORE.requests.exists():
+            st.warning(("Τα αδιάβαστα αιτήματα του requests.jsonl καταχωρίζονται πριν τον διαχωρισμό και " if INGEST_REQUESTS else "Το ")
+                       + "requests.jsonl κρατιέται ως requests.jsonl.pre-shard. Μετά, τα kiosks πρέπει να γράφουν στο "
+                       "schools/<σχολείο>/requests.jsonl — το requests.jsonl της ρίζας δεν διαβάζεται πλέον.")
+        if st.button("🏫 Διαχωρισμός δεδομένων", key="shard_btn"):
+            n = shard_by_school()
+            st.success(f"Δημιουργήθηκαν {n} σχολεία.")
+            st.rerun()
+
 # ---------------- UI ----------------
 show_topbar()
 
 pages = ["Κατάλογος", "Μαθητές", "Παραγγελίες", "Σύνοψη", "Δελτία"]
 if not is_admin:
     pages = ["Παραγγελίες", "Σύνοψη", "Δελτία"]
+elif STORE is None:
+    pages = ["Κατάλογος", "Σύνοψη", "Δελτία"]  # cross-school view is read-only for rosters and orders
 page = st.sidebar.radio("Μενού", pages, index=0)
+st.session_state["data_version"] = _data_version()
 
 # ---------------- Κατάλογος ----------------
 if page == "Κατάλογος":
@@ -346,7 +1207,7 @@ if page == "Κατάλογος":
         st.error("Μόνο διαχειριστής/ρια.")
         st.stop()
     st.subheader("Τιμοκατάλογος")
-    products = load_products().copy()
+    products = load_products()
 
     with st.form("add_product"):
         c1, c2 = st.columns([3,1])
@@ -367,32 +1228,43 @@ if page == "Κατάλογος":
     st.markdown("**Ανέβασμα Excel προϊόντων (Προϊόν – Τιμή)**")
     replace_products = st.checkbox("✅ Αντικατάσταση όλων των υπαρχόντων προϊόντων", key="replace_products")
     uplp = st.file_uploader("Επιλογή αρχείου Excel προϊόντων", type=["xlsx"])
-    if uplp is not None:
+    # one import per (file, mode): ticking "Αντικατάσταση" after the upload applies it again
+    if uplp is not None and st.session_state.get("imported_products_file") != (getattr(uplp, "file_id", uplp.name), replace_products):
         try:
-            xl = pd.ExcelFile(uplp)
-            frames = []
-            for sh in xl.sheet_names:
-                df = pd.read_excel(xl, sheet_name=sh)
-                headers = {str(c).strip().lower(): c for c in df.columns}
-                if "προϊόν" in headers and "τιμή" in headers:
-                    tmp = df.rename(columns={headers["προϊόν"]:"product", headers["τιμή"]:"price"})[["product","price"]]
-                elif "product" in headers and "price" in headers:
-                    tmp = df.rename(columns={headers["product"]:"product", headers["price"]:"price"})[["product","price"]]
-                else:
-                    tmp = df.iloc[:, :2].copy()
-                    tmp.columns = ["product","price"]
-                frames.append(tmp)
-            merged = pd.concat(frames, ignore_index=True)[["product","price"]]
-            if replace_products:
-                save_products(merged)
-                st.success("Έγινε αντικατάσταση όλων των προϊόντων από το Excel.")
+            n_ins, n_upd, n_del = import_products_xlsx(uplp, replace=replace_products)
+            st.session_state["imported_products_file"] = (getattr(uplp, "file_id", uplp.name), replace_products)
+            if n_ins or n_upd or n_del:
+                st.success(f"Ο τιμοκατάλογος ενημερώθηκε από το Excel: {n_ins} νέα, {n_upd} αλλαγές τιμής, {n_del} διαγραφές.")
+                st.rerun()
             else:
-                save_products(pd.concat([products, merged], ignore_index=True))
-                st.success("Ο τιμοκατάλογος ενημερώθηκε από το Excel (συγχώνευση).")
-            st.rerun()
+                st.info("Καμία αλλαγή — ο τιμοκατάλογος είναι ήδη ενημερωμένος.")
         except Exception as e:
             st.error(f"Σφάλμα ανάγνωσης: {e}")
 
+    st.markdown("#### Επανατιμολόγηση παραγγελιών")
+    st.caption("Περνά τις τρέχουσες τιμές του καταλόγου στις υπάρχουσες γραμμές παραγγελιών (εκτός αρχειοθετημένων ετών).")
+    rc1, rc2, rc3 = st.columns([1,1,2])
+    with rc1:
+        rp_from = st.date_input("Από", value=(pd.Timestamp.today() - pd.Timedelta(days=7)).date(), key="reprice_from")
+    with rc2:
+        rp_to = st.date_input("Έως", value=date.today(), key="reprice_to")
+    with rc3:
+        rp_products = st.multiselect("Προϊόντα", products["product"].tolist(), key="reprice_products")
+    if rp_products:
+        diff = reprice_preview(rp_from, rp_to, rp_products)
+        if diff.empty:
+            st.info("Όλες οι γραμμές του διαστήματος έχουν ήδη τις τρέχουσες τιμές.")
+        else:
+            st.write(f"Γραμμές προς ενημέρωση: {len(diff)} • Σύνολο πριν: {diff['old_total'].sum():.2f} € • μετά: {diff['total'].sum():.2f} €")
+            st.dataframe(diff[["date","student","school","class","product","qty","old_unit_price","unit_price","old_total","total"]].head(1000).rename(columns={
+                "date":"Ημερομηνία","student":"Μαθητής/-τρια","school":"Σχολείο","class":"Τάξη","product":"Προϊόν","qty":"Ποσότητα",
+                "old_unit_price":"Τιμή πριν (€)","unit_price":"Τιμή μετά (€)","old_total":"Σύνολο πριν (€)","total":"Σύνολο μετά (€)"
+            }), use_container_width=True)
+            if st.button(f"💶 Επανατιμολόγηση {len(diff)} γραμμών", key="reprice_btn"):
+                n = reprice_orders(rp_from, rp_to, rp_products)
+                st.success(f"Ενημερώθηκαν {n} γραμμές.")
+                st.rerun()
+
     st.markdown("#### Διαγραφές")
     if not products.empty:
         to_delete = st.selectbox("Διαγραφή μεμονωμένου προϊόντος", products["product"].tolist(), key="del_prod_single")
@@ -422,74 +1294,50 @@ elif page == "Μαθητές":
         st.error("Μόνο διαχειριστής/ρια.")
         st.stop()
     st.subheader("Διαχείριση Μαθητών, Σχολείων & Τάξης")
-    students = load_students().copy()
+    students = load_students()
 
     with st.form("add_student"):
         c1, c2, c3 = st.columns([2,2,1])
         with c1:
             s = st.text_input("Ονοματεπώνυμο")
         with c2:
-            sch = st.text_input("Σχολείο", placeholder="π.χ. 1ο Γυμνάσιο")
+            sch = st.text_input("Σχολείο", value=shard_school() if SHARDS else "", placeholder="π.χ. 1ο Γυμνάσιο")
         with c3:
             cl = st.text_input("Τάξη", placeholder="π.χ. Β1, Γ2...")
         submitted = st.form_submit_button("➕ Προσθήκη")
     if submitted and s.strip():
-        exists = ((students["student"].str.lower()==s.strip().lower()) &
-                  (students["school"].str.lower()==sch.strip().lower()) &
-                  (students["class"].str.lower()==cl.strip().lower())).any()
-        if exists:
-            st.warning("Υπάρχει ήδη.")
+        if _foreign_schools([sch]):
+            st.error(f"Το σχολείο «{sch.strip()}» ανήκει σε άλλο φάκελο σχολείου — επίλεξε εκείνο το σχολείο από το πλαϊνό μενού.")
+        elif _new_schools([sch]):
+            add_students(pd.DataFrame([{"student": s.strip(), "school": sch.strip(), "class": cl.strip()}]), new_school_store(sch))
+            st.session_state["shard_next"] = _shard_dir(sch).name
+            st.success(f"Δημιουργήθηκε νέο σχολείο «{sch.strip()}».")
+            st.rerun()
+        elif _student_key(s, sch, cl) in student_key_index():
+            st.warning("Υπάρχει ήδη (ίδιο όνομα, σχολείο και τάξη, ανεξαρτήτως τόνων/κενών/κεφαλαίων).")
         else:
-            students.loc[len(students)] = [s.strip(), sch.strip(), cl.strip()]
-            save_students(students)
+            add_students(pd.DataFrame([{"student": s.strip(), "school": sch.strip(), "class": cl.strip()}]))
             st.success("Προστέθηκε.")
             st.rerun()
 
     st.markdown("**Ανέβασμα Excel: Ονοματεπώνυμο – Σχολείο – Τάξη**")
     replace_students = st.checkbox("✅ Αντικατάσταση όλων των υπαρχόντων μαθητών/τριών", key="replace_students")
     upl = st.file_uploader("Επιλογή αρχείου Excel", type=["xlsx"])
-    if upl is not None:
+    if upl is not None and st.session_state.get("imported_students_file") != (getattr(upl, "file_id", upl.name), replace_students):
         try:
-            xl = pd.ExcelFile(upl)
-            frames = []
-            for sh in xl.sheet_names:
-                df = pd.read_excel(xl, sheet_name=sh)
-                cols = {str(c).strip().lower(): c for c in df.columns}
-                if "ονοματεπώνυμο" in cols:
-                    if "σχολείο" not in cols: df["σχολείο"] = ""
-                    if "τάξη" not in cols: df["τάξη"] = ""
-                    tmp = df.rename(columns={"ονοματεπώνυμο":"student","σχολείο":"school","τάξη":"class"})[["student","school","class"]]
-                elif "student" in cols:
-                    if "school" not in cols: df["school"] = ""
-                    if "class"  not in cols: df["class"]  = ""
-                    tmp = df.rename(columns={"student":"student","school":"school","class":"class"})[["student","school","class"]]
-                else:
-                    tmp = df.copy()
-                    if tmp.shape[1] >= 3:
-                        tmp = tmp.iloc[:, :3]
-                        tmp.columns = ["student","school","class"]
-                    elif tmp.shape[1] == 2:
-                        tmp.columns = ["student","school"]
-                        tmp["class"] = ""
-                    else:
-                        tmp.columns = ["student"]
-                        tmp["school"] = ""
-                        tmp["class"] = ""
-                frames.append(tmp[["student","school","class"]])
-            merged = pd.concat(frames, ignore_index=True)[["student","school","class"]]
-            if replace_students:
-                save_students(merged)
-                st.success("Έγινε αντικατάσταση όλων των μαθητών/τριών από το Excel.")
+            n_ins, n_del = import_students_xlsx(upl, replace=replace_students)
+            st.session_state["imported_students_file"] = (getattr(upl, "file_id", upl.name), replace_students)
+            if n_ins or n_del:
+                st.success(f"Οι μαθητές ενημερώθηκαν από το Excel: {n_ins} νέες εγγραφές, {n_del} διαγραφές.")
+                st.rerun()
             else:
-                save_students(pd.concat([students, merged], ignore_index=True))
-                st.success("Οι μαθητές ενημερώθηκαν από το Excel (συγχώνευση).")
-            st.rerun()
+                st.info("Καμία αλλαγή — η λίστα μαθητών/τριών είναι ήδη ενημερωμένη.")
         except Exception as e:
             st.error(f"Σφάλμα ανάγνωσης: {e}")
 
     st.markdown("#### Διαγραφές")
     if not students.empty:
-        students = load_students().copy()
+        students = load_students()
         students["label"] = students.apply(lambda r: f"{r['student']} — {r['school']} — {r['class']}" if (str(r["school"]).strip() or str(r["class"]).strip()) else r["student"], axis=1)
         sel = st.selectbox("Διαγραφή μεμονωμένου/ης", students["label"].tolist(), key="del_student_single")
         confirm = st.checkbox("✅ Επιβεβαίωση", key="confirm_st_single")
@@ -503,7 +1351,7 @@ elif page == "Μαθητές":
 
     # Μαζική διαγραφή μαθητών/τριών
     st.markdown("#### Μαζική διαγραφή μαθητών/τριών")
-    students_all = load_students().copy()
+    students_all = load_students()
     students_all["label"] = students_all.apply(lambda r: f"{r['student']} — {r['school']} — {r['class']}" if (str(r["school"]).strip() or str(r["class"]).strip()) else r["student"], axis=1)
     to_multi = st.multiselect("Επέλεξε από τη λίστα", students_all["label"].tolist(), key="del_student_multi")
     confirm_multi = st.checkbox("✅ Επιβεβαίωση μαζικής", key="confirm_st_multi")
@@ -515,13 +1363,13 @@ elif page == "Μαθητές":
         st.rerun()
 
     st.markdown("#### Τρέχουσα λίστα")
-    st.dataframe(load_students().rename(columns={"student":"Ονοματεπώνυμο","school":"Σχολείο","class":"Τάξη"}), use_container_width=True)
+    st.dataframe(load_students()[["student","school","class"]].rename(columns={"student":"Ονοματεπώνυμο","school":"Σχολείο","class":"Τάξη"}), use_container_width=True)
 
 # ---------------- Παραγγελίες ----------------
 elif page == "Παραγγελίες":
     products = load_products()
     students = load_students()
-    orders = load_orders().copy()
+    orders = load_orders()
 
     tabs = st.tabs(["🆕 Νέα παραγγελία", "✏️ Διόρθωση / Διαγραφή"])
 
@@ -532,7 +1380,6 @@ elif page == "Παραγγελίες":
         if students.empty or products.empty:
             st.info("Πρέπει να υπάρχουν μαθητές/τριες και προϊόντα. Συμπλήρωσέ τα από τα μενού ‘Κατάλογος’ και ‘Μαθητές’.")
         else:
-            students = students.copy()
             students["label"] = students.apply(lambda r: f"{r['student']} — {r['school']} — {r['class']}" if (str(r["school"]).strip() or str(r["class"]).strip()) else r["student"], axis=1)
             c1, c2 = st.columns([1.2,3])
             with c1:
@@ -645,9 +1492,7 @@ elif page == "Παραγγελίες":
                     }]
                     new_ids = [oid]
 
-                orders_latest = load_orders().copy()
-                orders_latest = pd.concat([orders_latest, pd.DataFrame(new_rows)], ignore_index=True)
-                save_orders(orders_latest)
+                append_orders(pd.DataFrame(new_rows))
                 st.session_state.setdefault("my_last_orders", [])
                 st.session_state["my_last_orders"].extend(new_ids)
                 st.session_state["order_editor_df"] = pd.DataFrame({"Προϊόν": [""], "Ποσότητα": [1], "Μερικό (€)": [0.0]})
@@ -670,13 +1515,13 @@ elif page == "Παραγγελίες":
         st.caption(f"📦 Προϊόντα: {len(load_products())} • 👩‍🎓 Μαθητές: {len(load_students())}")
         products = load_products()
         students = load_students()
-        orders = load_orders().copy()
+        orders = load_orders()
 
         if not is_admin:
             only_mine = st.checkbox("Εμφάνιση μόνο των δικών μου καταχωρίσεων (συνεδρία)", value=True)
             if only_mine:
                 ids = st.session_state.get("my_last_orders", [])
-                orders = orders[orders["order_id"].isin(ids)].copy()
+                orders = orders[orders["order_id"].isin(ids)]
 
         c1, c2, c3 = st.columns(3)
         with c1:
@@ -686,7 +1531,7 @@ elif page == "Παραγγελίες":
         with c3:
             f_class = st.multiselect("Τάξεις", sorted(orders["class"].dropna().unique().tolist()))
 
-        df = orders.copy()
+        df = orders
         if f_student: df = df[df["student"].isin(f_student)]
         if f_school:  df = df[df["school"].isin(f_school)]
         if f_class:   df = df[df["class"].isin(f_class)]
@@ -707,9 +1552,7 @@ elif page == "Παραγγελίες":
             confirm_bulk = st.checkbox("✅ Επιβεβαίωση μαζικής διαγραφής", key="bulk_orders_confirm")
             if st.button("🗑️ Διαγραφή επιλεγμένων παραγγελιών") and bulk_sel and confirm_bulk:
                 oids = df.loc[df["label"].isin(bulk_sel), "order_id"].tolist()
-                orders_all = load_orders().copy()
-                orders_all = orders_all[~orders_all["order_id"].isin(oids)]
-                save_orders(orders_all)
+                delete_orders(oids)
                 if not is_admin:
                     st.session_state["my_last_orders"] = [x for x in st.session_state.get("my_last_orders", []) if x not in oids]
                 st.success(f"Διαγράφηκαν {len(oids)} γραμμές.")
@@ -742,20 +1585,18 @@ elif page == "Παραγγελίες":
                     del_btn = st.form_submit_button("🗑️ Διαγραφή γραμμής")
 
             if save_btn:
-                orders_all = load_orders().copy()
-                orders_all.loc[orders_all["order_id"]==oid, "date"] = pd.to_datetime(new_date)
                 parts = new_label.split(" — ")
                 ns = parts[0]; nsch = parts[1] if len(parts)>1 else ""; ncl = parts[2] if len(parts)>2 else ""
-                orders_all.loc[orders_all["order_id"]==oid, ["student","school","class"]] = [ns, nsch, ncl]
-                orders_all.loc[orders_all["order_id"]==oid, ["product","qty","unit_price","total"]] = [new_product, new_qty, new_price, new_qty*new_price]
-                save_orders(orders_all)
+                save_order_edits(pd.DataFrame([{
+                    "order_id": oid, "date": pd.to_datetime(new_date),
+                    "student": ns, "school": nsch, "class": ncl,
+                    "product": new_product, "qty": new_qty, "unit_price": new_price, "total": new_qty*new_price
+                }]))
                 st.success("Οι αλλαγές αποθηκεύτηκαν.")
                 st.rerun()
 
             if del_btn:
-                orders_all = load_orders().copy()
-                orders_all = orders_all[orders_all["order_id"]!=oid]
-                save_orders(orders_all)
+                delete_orders([oid])
                 st.session_state["my_last_orders"] = [x for x in st.session_state.get("my_last_orders", []) if x != oid]
                 st.success("Η γραμμή διαγράφηκε.")
                 st.rerun()
@@ -763,17 +1604,38 @@ elif page == "Παραγγελίες":
 # ---------------- Σύνοψη ----------------
 elif page == "Σύνοψη":
     st.subheader("Σύνοψη & Αναφορές")
+    if is_admin and _fragment is not None and st.checkbox("🔄 Ζωντανή ενημέρωση", value=True, key="summary_live"):
+        _live_refresh()
+    # shown before the empty-data check: a bulk delete may just have removed every live line
+    undo = st.session_state.get("summary_undo")
+    if undo is not None:
+        st.info(f"Διαγράφηκαν {len(undo['rows'])} γραμμές ({undo['rows']['total'].sum():.2f} €).")
+        cu1, cu2 = st.columns(2)
+        with cu1:
+            if st.button("↩️ Αναίρεση τελευταίας μαζικής διαγραφής", key="summary_undo_btn"):
+                save_order_edits(undo["rows"], DataStore(undo["root"]))
+                del st.session_state["summary_undo"]
+                st.rerun()
+        with cu2:
+            if st.button("✖️ Απόκρυψη", key="summary_undo_dismiss"):
+                del st.session_state["summary_undo"]
+                st.rerun()
     orders = load_orders()
-    if orders.empty:
+    parts = archive_manifest()
+    if orders.empty and not parts:
         st.info("Δεν υπάρχουν ακόμη παραγγελίες.")
     else:
         col_date1, col_date2 = st.columns(2)
-        min_d = orders["date"].min().date() if pd.notna(orders["date"].min()) else date.today()
-        max_d = orders["date"].max().date() if pd.notna(orders["date"].max()) else date.today()
+        min_d = orders["date"].min().date() if pd.notna(orders["date"].min()) else (date.fromisoformat(parts[-1]["from"]) if parts else date.today())
+        max_d = orders["date"].max().date() if pd.notna(orders["date"].max()) else (date.fromisoformat(parts[-1]["to"]) if parts else date.today())
         with col_date1:
-            d_from = st.date_input("Από", value=min_d)
+            d_from = st.date_input("Από", value=min_d, min_value=min(date.fromisoformat(parts[0]["from"]), min_d) if parts else None)
         with col_date2:
             d_to = st.date_input("Έως", value=max_d)
+        if parts:
+            st.caption("🗄️ Αρχειοθετημένα σχολικά έτη: " + ", ".join(f"{p['from'][:4]}-{p['to'][:4]}" for p in parts) + " — φορτώνονται μόνο αν το διάστημα τα περιλαμβάνει.")
+        live_ids = orders["order_id"]
+        orders = with_archived_orders(orders, d_from, d_to)
 
         c1, c2, c3, c4 = st.columns(4)
         with c1:
@@ -785,7 +1647,7 @@ elif page == "Σύνοψη":
         with c4:
             classes_filter  = st.multiselect("Τάξεις", sorted(orders["class"].dropna().unique().tolist()))
 
-        df = orders.copy()
+        df = orders
         df = df[(df["date"] >= pd.to_datetime(d_from)) & (df["date"] <= pd.to_datetime(d_to))]
         if students_filter: df = df[df["student"].isin(students_filter)]
         if products_filter: df = df[df["product"].isin(products_filter)]
@@ -878,35 +1740,39 @@ elif page == "Σύνοψη":
                 st.download_button("⬇️ Λήψη", data=pdfbuf.getvalue(), file_name="προς_κατάστημα.pdf", mime="application/pdf")
 
         st.divider()
-        st.markdown("### Μαζική διαγραφή από τα αναλυτικά")
-        df_labels = df.sort_values(["date","student","product"]).copy()
-        df_labels["label"] = df_labels.apply(lambda r: f"{r['date'].date() if pd.notna(r['date']) else ''} • {r['student']} • {r['school']} • {r['class']} • {r['product']} (qty {int(r['qty']) if pd.notna(r['qty']) and int(r['qty'])>0 else 0})", axis=1)
-        sel_bulk = st.multiselect("Επίλεξε γραμμές για διαγραφή", df_labels["label"].tolist(), key="summary_bulk_sel")
+        st.markdown("### Μαζική διαγραφή με τα τρέχοντα φίλτρα")
+        if STORE is None:
+            st.caption("Η μαζική διαγραφή γίνεται ανά σχολείο: επίλεξε σχολείο από το πλαϊνό μενού.")
+            st.stop()
+        if not is_admin:
+            st.caption("Η μαζική διαγραφή γίνεται μόνο από διαχειριστή/ρια.")
+            st.stop()
+        doomed = df[df["order_id"].isin(live_ids)]
+        st.write(f"Γραμμές που ταιριάζουν: {len(doomed)} • Ποσότητα: {int(doomed['qty'].sum())} • Σύνολο: {doomed['total'].sum():.2f} €")
+        if len(doomed) < len(df):
+            st.caption(f"{len(df) - len(doomed)} αρχειοθετημένες γραμμές του διαστήματος δεν διαγράφονται.")
         confirm_bulk = st.checkbox("✅ Επιβεβαίωση μαζικής διαγραφής", key="summary_bulk_confirm")
-        if st.button("🗑️ Διαγραφή επιλεγμένων (Σύνοψη)") and sel_bulk and confirm_bulk:
-            oids = df_labels.loc[df_labels["label"].isin(sel_bulk), "order_id"].tolist()
-            all_orders = load_orders().copy()
-            all_orders = all_orders[~all_orders["order_id"].isin(oids)]
-            save_orders(all_orders)
-            if not is_admin:
-                st.session_state["my_last_orders"] = [x for x in st.session_state.get("my_last_orders", []) if x not in oids]
-            st.success(f"Διαγράφηκαν {len(oids)} γραμμές.")
+        if st.button("🗑️ Διαγραφή όλων όσων ταιριάζουν (Σύνοψη)", key="summary_bulk_btn") and confirm_bulk and not doomed.empty:
+            st.session_state["summary_undo"] = {"root": str(STORE.root), "rows": doomed[ORDER_COLS]}
+            delete_orders(doomed["order_id"])
             st.rerun()
 
 # ---------------- Δελτία ----------------
 elif page == "Δελτία":
     st.subheader("Δελτίο & Εκτύπωση PDF")
     orders = load_orders()
-    if orders.empty:
+    parts = archive_manifest()
+    if orders.empty and not parts:
         st.info("Δεν υπάρχουν ακόμη παραγγελίες.")
     else:
         col_date1, col_date2 = st.columns(2)
-        min_d = orders["date"].min().date() if pd.notna(orders["date"].min()) else date.today()
-        max_d = orders["date"].max().date() if pd.notna(orders["date"].max()) else date.today()
+        min_d = orders["date"].min().date() if pd.notna(orders["date"].min()) else (date.fromisoformat(parts[-1]["from"]) if parts else date.today())
+        max_d = orders["date"].max().date() if pd.notna(orders["date"].max()) else (date.fromisoformat(parts[-1]["to"]) if parts else date.today())
         with col_date1:
-            d_from = st.date_input("Από", value=min_d, key="b_from")
+            d_from = st.date_input("Από", value=min_d, key="b_from", min_value=min(date.fromisoformat(parts[0]["from"]), min_d) if parts else None)
         with col_date2:
             d_to = st.date_input("Έως", value=max_d, key="b_to")
+        orders = with_archived_orders(orders, d_from, d_to)
 
         c1, c2, c3 = st.columns(3)
         with c1:
@@ -918,7 +1784,7 @@ elif page == "Δελτία":
             df_names = df_for if sel_class=="Όλες" else df_for[df_for["class"]==sel_class]
             sel_student = st.selectbox("Μαθητής/-τρια (ή Όλοι/-ες)", ["Όλοι/-ες"] + sorted(df_names["student"].dropna().unique().tolist()))
 
-        df = orders.copy()
+        df = orders
         df = df[(df["date"]>=pd.to_datetime(d_from)) & (df["date"]<=pd.to_datetime(d_to))]
         if sel_school != "Όλα": df = df[df["school"] == sel_school]
         if sel_class != "Όλες": df = df[df["class"] == sel_class]
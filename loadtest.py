@@ -0,0 +1,158 @@
+"""Headless load test for app.py.
+
+Runs N order-entry sessions and M Σύνοψη sessions against a scratch copy of the
+data through Streamlit's testing API, then reports submission latency,
+throughput and any order_ids that were lost or written twice. AppTest is not
+thread-safe, so every session runs in its own process, which is also the
+worst case for writers (several server processes sharing one data directory).
+
+    python loadtest.py --submitters 8 --browsers 2 --orders 20
+"""
+import argparse, multiprocessing as mp, os, random, shutil, statistics, tempfile, time
+from pathlib import Path
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP = Path(__file__).resolve().parent / "app.py"
+SRC = APP.parent
+ADMIN_PIN = "1234"
+
+
+def _session():
+    at = AppTest.from_file(str(APP), default_timeout=120)
+    at.secrets["ADMIN_PIN"] = ADMIN_PIN
+    at.secrets["APP_URL"] = ""
+    at.run()
+    return at
+
+
+def _goto(at, page):
+    at.sidebar.radio[0].set_value(page).run()
+
+
+def submitter(args):
+    n_orders, seed = args
+    rng = random.Random(seed)
+    latencies, submitted, errors = [], [], []
+    try:
+        at = _session()
+        _goto(at, "Παραγγελίες")
+        labels = at.selectbox(key="order_student").options
+        catalog = pd.read_csv("products.csv")["product"].tolist()
+        for _ in range(n_orders):
+            at.selectbox(key="order_student").set_value(rng.choice(labels)).run()
+            k = rng.randint(1, 3)
+            at.session_state["order_editor_df"] = pd.DataFrame({
+                "Προϊόν": rng.sample(catalog, k),
+                "Ποσότητα": [rng.randint(1, 3) for _ in range(k)],
+                "Μερικό (€)": [0.0] * k,
+            })
+            before = len(at.session_state["my_last_orders"]) if "my_last_orders" in at.session_state else 0
+            btn = next(b for b in at.button if b.label.startswith("✅ Καταχώριση"))
+            t0 = time.perf_counter()
+            btn.click().run()
+            latencies.append(time.perf_counter() - t0)
+            if at.exception:
+                errors.append(at.exception[0].message)
+            elif "my_last_orders" in at.session_state:
+                submitted.extend(at.session_state["my_last_orders"][before:])
+    except Exception as e:
+        errors.append(repr(e))
+    return latencies, submitted, errors
+
+
+def browser(stop, out):
+    latencies, errors = [], []
+    try:
+        at = _session()
+        at.sidebar.selectbox[0].set_value("Διαχειριστής").run()
+        at.sidebar.text_input[0].set_value(ADMIN_PIN).run()
+        _goto(at, "Σύνοψη")
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            at.run()
+            latencies.append(time.perf_counter() - t0)
+            if at.exception:
+                errors.append(at.exception[0].message)
+    except Exception as e:
+        errors.append(repr(e))
+    out.put((latencies, errors))
+
+
+def _pct(xs, p):
+    if not xs:
+        return float("nan")
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+def _stored_ids():
+    # what the app itself loads: its data layer (base file + patch log) run on every data directory
+    src = APP.read_text(encoding="utf-8")
+    app = {"__name__": "loadtest_app"}
+    exec(compile(src[:src.index("# ---------------- UI ----------------")], str(APP), "exec"), app)
+    roots = sorted(p for p in Path("schools").iterdir() if p.is_dir()) if Path("schools").is_dir() else [Path(".")]
+    return pd.concat([app["_read_orders"](app["DataStore"](r))["order_id"] for r in roots], ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--submitters", type=int, default=8, help="concurrent order-entry sessions (N)")
+    ap.add_argument("--browsers", type=int, default=2, help="concurrent Σύνοψη sessions (M)")
+    ap.add_argument("--orders", type=int, default=10, help="orders submitted per session")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch data directory")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    for f in ["products.csv", "students.csv"]:
+        shutil.copy(SRC / f, work / f)
+    (work / ".streamlit").mkdir()
+    (work / ".streamlit" / "secrets.toml").write_text(f'ADMIN_PIN = "{ADMIN_PIN}"\nAPP_URL = ""\n', encoding="utf-8")
+    os.chdir(work)
+
+    sub_lat, br_lat, submitted, errors = [], [], [], []
+    stop, out = mp.Event(), mp.Queue()
+    browsers = [mp.Process(target=browser, args=(stop, out)) for _ in range(args.browsers)]
+    for p in browsers:
+        p.start()
+    with mp.Pool(args.submitters) as pool:
+        t0 = time.perf_counter()
+        for lat, ids, errs in pool.imap_unordered(submitter, [(args.orders, args.seed + i) for i in range(args.submitters)]):
+            sub_lat += lat
+            submitted += ids
+            errors += errs
+        wall = time.perf_counter() - t0
+    stop.set()
+    for _ in browsers:
+        lat, errs = out.get()
+        br_lat += lat
+        errors += errs
+    for p in browsers:
+        p.join()
+
+    stored = _stored_ids()
+    counts = stored.value_counts()
+    lost = sorted(set(submitted) - set(stored))
+    dup = counts[counts > 1].index.tolist()
+
+    print(f"sessions: {args.submitters} submitting × {args.orders} orders, {args.browsers} browsing Σύνοψη")
+    print(f"submissions: {len(sub_lat)} in {wall:.2f}s → {len(sub_lat) / wall:.1f}/s")
+    print("submission latency (s): p50 {:.3f}  p95 {:.3f}  p99 {:.3f}  max {:.3f}".format(
+        _pct(sub_lat, 50), _pct(sub_lat, 95), _pct(sub_lat, 99), max(sub_lat, default=float("nan"))))
+    if br_lat:
+        print("Σύνοψη rerun (s):      p50 {:.3f}  p95 {:.3f}  p99 {:.3f}  ({} reruns, mean {:.3f})".format(
+            _pct(br_lat, 50), _pct(br_lat, 95), _pct(br_lat, 99), len(br_lat), statistics.mean(br_lat)))
+    print(f"order lines: {len(submitted)} submitted, {len(stored)} stored, {len(lost)} lost, {len(dup)} duplicated")
+    for e in sorted(set(errors))[:10]:
+        print("error:", e)
+    if args.keep:
+        print("data:", work)
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    return 1 if (lost or dup or errors) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())